@@ -1,5 +1,6 @@
 import parser
 import definitions as defs
+import instrumentation as instr
 import numpy as np
 from typing import Tuple
 
@@ -63,22 +64,47 @@ def get_angle(seg1: Tuple[defs.KP2D, defs.KP2D], seg2: Tuple[defs.KP2D, defs.KP2
 
     return np.arccos(np.clip(np.dot(vec1, vec2), -1.0, 1.0))
 
-def get_all_lengths(kps):
+def _count_features(stage, kps, values):
+    """
+    record instrumentation counters and a memory gauge for one feature extraction call.
+
+    params:
+        stage (str): instrumentation stage name, e.g. 'features.lengths'.
+        kps (Dict[str, defs.KP2D]): the keypoints the features were computed from.
+        values (List): the computed features, with -1 marking missing keypoints.
+
+    returns:
+        List: `values`, unchanged.
+    """
+    if not instr.is_enabled():
+        return values
+    if not kps:
+        instr.count(f'{stage}.empty_poses')
+    else:
+        instr.count(f'{stage}.poses')
+        instr.count(f'{stage}.missing', values.count(-1))
+    instr.gauge_memory(stage)
+    return values
+
+@instr.timed('features.get_all_lengths')
+def get_all_lengths(kps, checks=None):
     """
     calculates the lengths of predefined segments (defined in LENGTH_CHECKS) between keypoints.
 
     params:
         kps (Dict[str, defs.KP2D]): dict of keypoints, with labels as keys.
+        checks (List[Tuple[str, str]], optional): segments to measure. Defaults to `LENGTH_CHECKS`.
 
     returns:
-        List[float]: list of lengths for each segment defined in `LENGTH_CHECKS`.
+        List[float]: list of lengths for each segment defined in `checks`.
                     if keypoint is missing, corresponding length for segment is set to -1.
     """
 
+    checks = LENGTH_CHECKS if checks is None else checks
     if not kps:
-        return [-1] * len(LENGTH_CHECKS)
+        return _count_features('features.lengths', kps, [-1] * len(checks))
     lengths = []
-    for seg in LENGTH_CHECKS:
+    for seg in checks:
         key1, key2 = seg
         if key1 not in kps or key2 not in kps:
             lengths.append(-1)
@@ -86,23 +112,26 @@ def get_all_lengths(kps):
             p1 = kps[key1]
             p2 = kps[key2]
             lengths.append(get_length(p1, p2))
-    return lengths
+    return _count_features('features.lengths', kps, lengths)
 
-def get_all_angles(kps):
+@instr.timed('features.get_all_angles')
+def get_all_angles(kps, checks=None):
     """
     calculates the angles between predefined keypoint triplets (defined in ANGLE_CHECKS).
 
     params:
         kps (Dict[str, defs.KP2D]): dict of keypoints, with labels as keys.
+        checks (List[Tuple[str, str, str]], optional): triplets to measure. Defaults to `ANGLE_CHECKS`.
 
     returns:
-        List[float]: list of angles for each triplet defined in `ANGLE_CHECKS`.
+        List[float]: list of angles for each triplet defined in `checks`.
                     if keypoint is missing, corresponding angle for triplet is set to -1.
     """
+    checks = ANGLE_CHECKS if checks is None else checks
     if not kps:
-        return [-1] * len(ANGLE_CHECKS)
+        return _count_features('features.angles', kps, [-1] * len(checks))
     angles = []
-    for triad in ANGLE_CHECKS:
+    for triad in checks:
         key1, key2, key3 = triad
         if key1 not in kps or key2 not in kps or key3 not in kps:
             angles.append(-1)
@@ -111,31 +140,35 @@ def get_all_angles(kps):
             mid = kps[key2]
             end = kps[key3]
             angles.append(get_angle((beg, mid), (mid, end)))
-    return angles
+    return _count_features('features.angles', kps, angles)
 
-def check_presences(kps, conf_thresh=0.6):
+@instr.timed('features.check_presences')
+def check_presences(kps, conf_thresh=0.6, checks=None):
     """
     check 'presence' of keypoints based on their confidence scores.
 
     Args:
         kps (Dict[str, defs.KP2D]): A dictionary of keypoints with their labels as keys.
         conf_thresh (float, optional): The confidence threshold for considering a keypoint as present. Defaults to 0.6.
+        checks (List[str], optional): keypoint names to check. Defaults to `PRESENCE_CHECKS`.
 
     Returns:
-        List[int]: 1 for present keypoint, 0 for absent keypoint. order defined in `PRESENCE_CHECKS`.
+        List[int]: 1 for present keypoint, 0 for absent keypoint. order defined in `checks`.
                 if a keypoint is missing or its confidence is below the threshold, presence set to 0.
     """
+    checks = PRESENCE_CHECKS if checks is None else checks
     if not kps:
-        return [-1] * len(PRESENCE_CHECKS)
+        return _count_features('features.presences', kps, [-1] * len(checks))
     presences = []
-    for key in PRESENCE_CHECKS:
+    for key in checks:
         if key not in kps:
             presences.append(0)
             continue
         if(kps[key].prob > conf_thresh):
             presences.append(1)
-        presences.append(0)
-    return presences
+        else:
+            presences.append(0)
+    return _count_features('features.presences', kps, presences)
 
 if __name__ == '__main__': 
     # TODO: add path here
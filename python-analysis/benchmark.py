@@ -0,0 +1,441 @@
+import parser
+import analyzer
+import video_utils as vidutils
+import definitions as defs
+import argparse
+import gc
+import json
+import random
+import tempfile
+import time
+import tracemalloc
+import cv2 as cv
+import numpy as np
+from pathlib import Path
+
+# keypoint layout used by each model id when none is given explicitly
+DEFAULT_LAYOUTS = {
+    'movenet': 17,
+    'posenet': 17,
+    'blazepose': 33
+}
+
+KP_LAYOUTS = {
+    17: (defs.KP_DICT_17, defs.SKELETON_17_KPS),
+    33: (defs.KP_DICT_33, defs.SKELETON_33_KPS)
+}
+
+PERCENTILES = [50, 90, 99]
+MIN_MEM_CHANGE_KB = 64
+
+def parse_model_spec(spec):
+    """
+    parse a model spec of the form `model_id` or `model_id:layout` into a (model_id, layout) pair.
+
+    params:
+        spec (str): model spec, e.g. 'movenet' or 'blazepose:33'.
+
+    returns:
+        tuple[str, int]: the model id and its keypoint layout (17 or 33).
+    """
+
+    if ':' in spec:
+        model_id, layout = spec.split(':', 1)
+        layout = int(layout)
+    else:
+        model_id = spec
+        layout = DEFAULT_LAYOUTS.get(model_id, 17)
+    if layout not in KP_LAYOUTS:
+        raise ValueError(f'unsupported keypoint layout {layout} for model {model_id}; expected 17 or 33.')
+    return model_id, layout
+
+def generate_session(duration=60.0, fps=30.0, models=('movenet', 'blazepose'), persons=1,
+                     width=640, height=480, seed=0):
+    """
+    generate a synthetic inference session following the JSON schema described in the README.
+
+    params:
+        duration (float, optional): session length in seconds. Defaults to 60.
+        fps (float, optional): inference frames per second. Defaults to 30.
+        models (iterable[str], optional): model specs (see `parse_model_spec`) run on every frame.
+        persons (int, optional): number of poses reported per model per frame. Defaults to 1.
+        width (int, optional): frame width that keypoint x coordinates are bounded by. Defaults to 640.
+        height (int, optional): frame height that keypoint y coordinates are bounded by. Defaults to 480.
+        seed (int, optional): random seed so sessions are reproducible between runs. Defaults to 0.
+
+    returns:
+        list[list[dict]]: the session, one inner list of model predictions per frame.
+    """
+
+    rng = random.Random(seed)
+    model_specs = [parse_model_spec(m) for m in models]
+    n_frames = int(duration * fps)
+    session = []
+
+    for fidx in range(n_frames):
+        timestamp = round(fidx / fps, 6)
+        entry = []
+        for model_id, layout in model_specs:
+            kp_names = list(KP_LAYOUTS[layout][0].keys())
+            pose_data = []
+            for _ in range(persons):
+                # anchor each person somewhere in frame and scatter keypoints around it
+                cx = rng.uniform(0.25, 0.75) * width
+                cy = rng.uniform(0.25, 0.75) * height
+                pose = {'score': rng.random(), 'keypoints': []}
+                for name in kp_names:
+                    pose['keypoints'].append({
+                        'x': min(max(cx + rng.gauss(0, width / 8), 0), width - 1),
+                        'y': min(max(cy + rng.gauss(0, height / 8), 0), height - 1),
+                        'score': rng.random(),
+                        'name': name
+                    })
+                if layout == 33:
+                    pose['keypoints3D'] = [{
+                        'x': rng.uniform(-1, 1),
+                        'y': rng.uniform(-1, 1),
+                        'z': rng.uniform(-1, 1),
+                        'score': kp['score'],
+                        'name': kp['name']
+                    } for kp in pose['keypoints']]
+                pose_data.append(pose)
+            entry.append({'timeStamp': timestamp, 'frameIdx': fidx, 'modelId': model_id, 'poseData': pose_data})
+        session.append(entry)
+    return session
+
+def generate_video(vidpath, duration=10.0, fps=30.0, width=640, height=480):
+    """
+    write a synthetic mp4 test video to disk so frame decode and drawing can be benchmarked
+    without recorded footage.
+
+    params:
+        vidpath (str): path where the mp4 file will be saved.
+        duration (float, optional): video length in seconds. Defaults to 10.
+        fps (float, optional): frames per second. Defaults to 30.
+        width (int, optional): frame width. Defaults to 640.
+        height (int, optional): frame height. Defaults to 480.
+
+    returns:
+        int: number of frames written.
+    """
+
+    writer = cv.VideoWriter(str(vidpath), cv.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    n_frames = int(duration * fps)
+    gradient = np.tile(np.linspace(0, 255, width, dtype=np.uint8), (height, 1))
+    for fidx in range(n_frames):
+        # moving gradient so consecutive frames differ and the encoder does real work
+        frame = np.dstack([np.roll(gradient, fidx * 4, axis=1), gradient[:, ::-1],
+                           np.full((height, width), fidx % 256, dtype=np.uint8)])
+        cv.putText(frame, str(fidx), (10, 40), cv.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+        writer.write(frame)
+    writer.release()
+    return n_frames
+
+def summarize_latencies(latencies, items):
+    """
+    reduce a list of per-call latencies into throughput and percentile statistics.
+
+    params:
+        latencies (list[float]): per-call wall time in seconds.
+        items (int): total number of items processed across all calls.
+
+    returns:
+        dict: calls, items, throughput (items/s), mean/percentile/max latency in milliseconds.
+    """
+
+    lat = np.array(latencies) * 1000
+    total = lat.sum() / 1000
+    stats = {
+        'calls': len(latencies),
+        'items': items,
+        'throughput': items / total if total > 0 else float('inf'),
+        'mean_ms': float(lat.mean()),
+        'max_ms': float(lat.max())
+    }
+    for p in PERCENTILES:
+        stats[f'p{p}_ms'] = float(np.percentile(lat, p))
+    return stats
+
+def run_stage(fn, args_list, items_per_call=1, repeat=5, warmup=1):
+    """
+    time `fn` over every argument tuple in `args_list`, `repeat` times after `warmup` untimed
+    passes, and report the best value of each statistic across passes (lowest latency, highest
+    throughput), as `timeit` does: slower passes are interference from the rest of the system,
+    not the code. garbage collection is paused while timing. the first call is then re-run once under tracemalloc to get the peak
+    memory of a single call. timing and memory passes are kept separate since tracemalloc slows
+    allocation-heavy code considerably.
+
+    params:
+        fn (callable): the function being benchmarked.
+        args_list (list[tuple]): positional arguments for each call.
+        items_per_call (int, optional): items processed per call, used for throughput. Defaults to 1.
+        repeat (int, optional): number of timed passes over `args_list`. Defaults to 5.
+        warmup (int, optional): number of untimed passes run first. Defaults to 1.
+
+    returns:
+        dict or None: best latency statistics (see `summarize_latencies`) across passes, the
+        median p50 across passes, the number of passes, and `peak_mem_kb` for one call.
+        None if `args_list` is empty.
+    """
+
+    if not args_list:
+        return None
+
+    for _ in range(warmup):
+        for args in args_list:
+            fn(*args)
+
+    passes = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            latencies = []
+            for args in args_list:
+                start = time.perf_counter()
+                fn(*args)
+                latencies.append(time.perf_counter() - start)
+            passes.append(summarize_latencies(latencies, items_per_call * len(args_list)))
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    stats = {key: float(min(s[key] for s in passes)) for key in passes[0]}
+    stats['throughput'] = float(max(s['throughput'] for s in passes))
+    stats['calls'] = passes[0]['calls']
+    stats['items'] = passes[0]['items']
+    stats['repeat'] = repeat
+    stats['median_p50_ms'] = float(np.median([s['p50_ms'] for s in passes]))
+
+    # leave an outer capture (e.g. instrumentation.run(trace_memory=True)) running if there is one
+    was_tracing = tracemalloc.is_tracing()
+    if was_tracing:
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    fn(*args_list[0])
+    _, peak = tracemalloc.get_traced_memory()
+    if not was_tracing:
+        tracemalloc.stop()
+    stats['peak_mem_kb'] = (peak - baseline) / 1024
+    return stats
+
+def run_benchmarks(duration=60.0, fps=30.0, models=('movenet', 'blazepose'), persons=1,
+                   lookups=500, frames=50, repeat=5, warmup=1, seed=0, workdir=None):
+    """
+    run every hot-path stage against a synthetic session and video.
+
+    stages:
+        parse: `parser.clean_dict_from_JSON` over the whole session file (items = predictions).
+        lookup: `parser.get_data_at_time` at random timestamps.
+        features: `analyzer.get_all_angles`, `get_all_lengths` and `check_presences` per pose.
+        decode: `video_utils.get_frame_from_fnum` at random frame numbers.
+        render: `parser.draw_pose_on_frame` with skeleton connections.
+    stages with no calls (e.g. `lookups=0`) are left out of the results.
+
+    params:
+        duration (float, optional): session length in seconds. Defaults to 60.
+        fps (float, optional): inference frames per second. Defaults to 30.
+        models (iterable[str], optional): model specs (see `parse_model_spec`).
+        persons (int, optional): poses per model per frame. Defaults to 1.
+        lookups (int, optional): number of lookup/feature calls. Defaults to 500.
+        frames (int, optional): number of decode/render calls. Defaults to 50.
+        repeat (int, optional): number of timed passes per stage. Defaults to 5.
+        warmup (int, optional): number of untimed passes per stage. Defaults to 1.
+        seed (int, optional): random seed for the session and sampled timestamps. Defaults to 0.
+        workdir (str, optional): directory for generated files; a temporary one is used if None.
+
+    returns:
+        dict: the run config and per-stage statistics, suitable for `save_results`.
+    """
+
+    if int(duration * fps) < 1:
+        raise ValueError(f'duration * fps must cover at least one frame, got {duration} * {fps}.')
+    if persons < 1 or lookups < 0 or frames < 0 or repeat < 1 or warmup < 0:
+        raise ValueError('persons and repeat must be >= 1; lookups, frames and warmup must be >= 0.')
+
+    rng = random.Random(seed)
+    model_specs = [parse_model_spec(m) for m in models]
+    config = {
+        'duration': duration, 'fps': fps, 'models': [f'{m}:{l}' for m, l in model_specs],
+        'persons': persons, 'lookups': lookups, 'frames': frames, 'repeat': repeat,
+        'warmup': warmup, 'seed': seed
+    }
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        workdir = Path(workdir or tmpdir)
+        json_path = workdir / 'bench_session.json'
+        vid_path = workdir / 'bench_video.mp4'
+
+        session = generate_session(duration, fps, models, persons, seed=seed)
+        with open(json_path, 'w') as f:
+            json.dump(session, f)
+        n_preds = sum(len(entry) for entry in session)
+
+        stages = {}
+        stages['parse'] = run_stage(parser.clean_dict_from_JSON, [(str(json_path),)], items_per_call=n_preds,
+                                    repeat=repeat, warmup=warmup)
+        data, max_ts = parser.clean_dict_from_JSON(str(json_path))
+
+        model_ids = [m for m, _ in model_specs]
+        queries = [(data, rng.uniform(0, max_ts), rng.choice(model_ids)) for _ in range(lookups)]
+        stages['lookup'] = run_stage(parser.get_data_at_time, queries, repeat=repeat, warmup=warmup)
+
+        kps_list = [parser.get_data_at_time(*q) for q in queries]
+        def extract_features(kps):
+            analyzer.get_all_angles(kps)
+            analyzer.get_all_lengths(kps)
+            analyzer.check_presences(kps)
+        stages['features'] = run_stage(extract_features, [(kps,) for kps in kps_list], repeat=repeat, warmup=warmup)
+
+        if frames:
+            vid_frames = generate_video(vid_path, duration=min(duration, 10.0), fps=fps)
+            fnums = [rng.randint(1, vid_frames) for _ in range(frames)]
+            stages['decode'] = run_stage(vidutils.get_frame_from_fnum, [(str(vid_path), fn) for fn in fnums],
+                                         repeat=repeat, warmup=warmup)
+
+            # skeletons are stored as index pairs, draw_pose_on_frame expects name pairs
+            layouts = dict(model_specs)
+            render_args = []
+            frame = vidutils.get_frame_from_fnum(str(vid_path), 1)
+            for (_, _, model_id), kps in list(zip(queries, kps_list))[:frames]:
+                kp_mapping, skeleton = KP_LAYOUTS[layouts[model_id]]
+                idx_to_name = {v: k for k, v in kp_mapping.items()}
+                skeleton_names = [(idx_to_name[a], idx_to_name[b]) for a, b in skeleton]
+                render_args.append((frame.copy(), kps, kp_mapping, skeleton_names))
+            # draw_pose_on_frame draws in place, so repeated passes redraw on the same frames
+            stages['render'] = run_stage(parser.draw_pose_on_frame, render_args, repeat=repeat, warmup=warmup)
+
+    stages = {name: stats for name, stats in stages.items() if stats is not None}
+    return {'config': config, 'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'stages': stages}
+
+def save_results(results, filepath):
+    """
+    store benchmark results as a JSON baseline.
+
+    params:
+        results (dict): output of `run_benchmarks`.
+        filepath (str): path of the JSON file to write.
+    """
+
+    Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+    with open(filepath, 'w') as f:
+        json.dump(results, f, indent=4)
+
+def load_results(filepath):
+    """
+    load benchmark results previously written by `save_results`.
+
+    params:
+        filepath (str): path of the JSON baseline.
+
+    returns:
+        dict: the stored results.
+    """
+
+    with open(filepath, 'r') as f:
+        return json.load(f)
+
+def compare_results(baseline, current, threshold=0.1, force=False):
+    """
+    compare two benchmark runs stage by stage. runs with different configs measure different
+    workloads, so they are refused unless `force` is set.
+
+    params:
+        baseline (dict): results of the reference run.
+        current (dict): results of the run being checked.
+        threshold (float, optional): relative change beyond which a metric is flagged. Defaults to 0.1.
+        force (bool, optional): compare even if the configs differ, printing a warning. Defaults to False.
+
+    returns:
+        list[dict]: one row per stage/metric with baseline, current, relative change and whether
+        the change is a regression (slower, lower throughput or more memory).
+    """
+
+    if baseline['config'] != current['config']:
+        diff = {k: (baseline['config'].get(k), current['config'].get(k))
+                for k in set(baseline['config']) | set(current['config'])
+                if baseline['config'].get(k) != current['config'].get(k)}
+        if not force:
+            raise ValueError(f'benchmark configs differ (baseline, current): {diff}')
+        print(f'[FLAG] comparing runs with different configs (baseline, current): {diff}')
+
+    rows = []
+    for stage, cur_stats in current['stages'].items():
+        base_stats = baseline['stages'].get(stage)
+        if base_stats is None:
+            continue
+        for metric in ['throughput', 'p50_ms', 'p99_ms', 'peak_mem_kb']:
+            base, cur = base_stats.get(metric), cur_stats.get(metric)
+            if not base or cur is None:
+                continue
+            change = (cur - base) / base
+            # higher throughput is better, for everything else lower is better
+            worse = change < -threshold if metric == 'throughput' else change > threshold
+            # a few KiB either way is allocator noise, not a regression
+            if metric == 'peak_mem_kb' and cur - base < MIN_MEM_CHANGE_KB:
+                worse = False
+            rows.append({'stage': stage, 'metric': metric, 'baseline': base, 'current': cur,
+                         'change': change, 'regression': worse})
+    return rows
+
+def print_results(results):
+    """
+    print a per-stage summary table of benchmark results.
+
+    params:
+        results (dict): output of `run_benchmarks`.
+    """
+
+    print(f"[LOGGING: benchmark] config: {results['config']}")
+    print(f"{'stage':<10}{'items/s':>14}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'peak KiB':>12}")
+    for stage, s in results['stages'].items():
+        print(f"{stage:<10}{s['throughput']:>14.1f}{s['p50_ms']:>10.3f}{s['p90_ms']:>10.3f}"
+              f"{s['p99_ms']:>10.3f}{s['peak_mem_kb']:>12.1f}")
+
+def print_comparison(rows):
+    """
+    print the output of `compare_results`, flagging regressions.
+
+    params:
+        rows (list[dict]): output of `compare_results`.
+    """
+
+    for r in rows:
+        flag = '[FLAG] ' if r['regression'] else ''
+        print(f"{flag}{r['stage']}.{r['metric']}: {r['baseline']:.3f} -> {r['current']:.3f} ({r['change']:+.1%})")
+
+
+if __name__ == '__main__':
+    argparser = argparse.ArgumentParser(description='benchmark the parse, lookup, feature and rendering hot paths.')
+    argparser.add_argument('--duration', type=float, default=60.0, help='session length in seconds')
+    argparser.add_argument('--fps', type=float, default=30.0, help='inference frames per second')
+    argparser.add_argument('--models', nargs='+', default=['movenet', 'blazepose'],
+                           help='model specs as model_id or model_id:layout (17 or 33)')
+    argparser.add_argument('--persons', type=int, default=1, help='poses per model per frame')
+    argparser.add_argument('--lookups', type=int, default=500, help='number of lookup/feature calls')
+    argparser.add_argument('--frames', type=int, default=50, help='number of decode/render calls')
+    argparser.add_argument('--repeat', type=int, default=5, help='timed passes per stage')
+    argparser.add_argument('--warmup', type=int, default=1, help='untimed passes per stage')
+    argparser.add_argument('--seed', type=int, default=0)
+    argparser.add_argument('--save', help='write results to this JSON baseline')
+    argparser.add_argument('--compare', help='compare results against this JSON baseline')
+    argparser.add_argument('--threshold', type=float, default=0.1, help='relative change flagged as regression')
+    argparser.add_argument('--force', action='store_true', help='compare against a baseline with a different config')
+    args = argparser.parse_args()
+
+    if args.duration <= 0 or args.fps <= 0 or int(args.duration * args.fps) < 1:
+        argparser.error('--duration * --fps must cover at least one frame')
+    if args.persons < 1 or args.repeat < 1:
+        argparser.error('--persons and --repeat must be at least 1')
+    if args.lookups < 0 or args.frames < 0 or args.warmup < 0:
+        argparser.error('--lookups, --frames and --warmup cannot be negative')
+
+    results = run_benchmarks(args.duration, args.fps, args.models, args.persons,
+                             args.lookups, args.frames, args.repeat, args.warmup, args.seed)
+    print_results(results)
+    if args.save:
+        save_results(results, args.save)
+    if args.compare:
+        print_comparison(compare_results(load_results(args.compare), results, args.threshold, args.force))
@@ -0,0 +1,430 @@
+import parser
+import analyzer
+import instrumentation as instr
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from definitions import KP2D
+from pathlib import Path
+
+# bump whenever the feature math in analyzer.py changes so stale columns are never reused
+FEATURE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# eviction trims down to this fraction of max_bytes so it does not rerun after every write
+EVICT_TO = 0.9
+
+def session_hash(filepath):
+    """
+    compute a content hash for a session JSON file, so renamed or copied sessions share cache
+    entries and edited sessions do not.
+
+    params:
+        filepath (str): path to the session JSON file.
+
+    returns:
+        str: hex sha256 digest of the file contents.
+    """
+
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def angle_column(triad):
+    """
+    params:
+        triad (Tuple[str, str, str]): keypoint triplet, as in `analyzer.ANGLE_CHECKS`.
+
+    returns:
+        tuple: column spec for the angle between the two segments of the triplet.
+    """
+
+    return ('angle', tuple(triad), {})
+
+def length_column(seg):
+    """
+    params:
+        seg (Tuple[str, str]): keypoint pair, as in `analyzer.LENGTH_CHECKS`.
+
+    returns:
+        tuple: column spec for the length of the segment.
+    """
+
+    return ('length', tuple(seg), {})
+
+def presence_column(key, conf_thresh=0.6):
+    """
+    params:
+        key (str): keypoint name, as in `analyzer.PRESENCE_CHECKS`.
+        conf_thresh (float, optional): confidence threshold passed to `analyzer.check_presences`. Defaults to 0.6.
+
+    returns:
+        tuple: column spec for the presence flag of the keypoint.
+    """
+
+    return ('presence', (key,), {'conf_thresh': conf_thresh})
+
+def default_columns(conf_thresh=0.6):
+    """
+    build column specs for every check currently defined in `analyzer`.
+
+    params:
+        conf_thresh (float, optional): confidence threshold for the presence columns. Defaults to 0.6.
+
+    returns:
+        list[tuple]: column specs for `ANGLE_CHECKS`, `LENGTH_CHECKS` and `PRESENCE_CHECKS`, in that order.
+        checks listed more than once (e.g. repeated pairs in `LENGTH_CHECKS`) appear only once.
+    """
+
+    return dedupe_columns([angle_column(t) for t in analyzer.ANGLE_CHECKS] +
+                          [length_column(s) for s in analyzer.LENGTH_CHECKS] +
+                          [presence_column(k, conf_thresh) for k in analyzer.PRESENCE_CHECKS])
+
+def dedupe_columns(columns):
+    """
+    params:
+        columns (list[tuple]): column specs, possibly with repeats.
+
+    returns:
+        list[tuple]: the column specs with repeats removed, keeping first-seen order.
+    """
+
+    unique = {}
+    for column in columns:
+        unique.setdefault(column_name(column), column)
+    return list(unique.values())
+
+def column_name(column):
+    """
+    params:
+        column (tuple): column spec.
+
+    returns:
+        str: readable column name, e.g. 'angle:left_hip,left_shoulder,right_shoulder' or
+        'presence:nose@conf_thresh=0.6'.
+    """
+
+    kind, spec, params = column
+    name = f"{kind}:{','.join(spec)}"
+    if params:
+        name += '@' + ','.join(f'{k}={v}' for k, v in sorted(params.items()))
+    return name
+
+def column_key(column, model_id):
+    """
+    params:
+        column (tuple): column spec.
+        model_id (str): model the column is computed for.
+
+    returns:
+        str: hex digest identifying the column's definition, parameters and feature version.
+    """
+
+    kind, spec, params = column
+    payload = json.dumps([FEATURE_VERSION, model_id, kind, list(spec), sorted(params.items())])
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+def compute_column(kps_rows, column):
+    """
+    compute a single feature column from per-timestamp keypoint dicts using the analyzer functions.
+
+    params:
+        kps_rows (list[dict[str, KP2D] or None]): keypoints for each timestamp, None where the model has no pose.
+        column (tuple): column spec.
+
+    returns:
+        np.ndarray: float64 column, -1 where keypoints are missing and nan where an angle is undefined.
+    """
+
+    kind, spec, params = column
+    if kind == 'angle':
+        values = [analyzer.get_all_angles(kps, checks=[spec])[0] for kps in kps_rows]
+    elif kind == 'length':
+        values = [analyzer.get_all_lengths(kps, checks=[spec])[0] for kps in kps_rows]
+    elif kind == 'presence':
+        values = [analyzer.check_presences(kps, checks=[spec[0]], **params)[0] for kps in kps_rows]
+    else:
+        raise ValueError(f'unknown feature column kind: {kind}')
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+
+def pose_arrays(data, ts_sorted, model_id):
+    """
+    pack the first pose of `model_id` at every timestamp into dense arrays, so feature columns
+    can be recomputed without re-parsing the session JSON.
+
+    params:
+        data (dict[float, dict[str, list[Pose]]]): parsed session, from `parser.clean_dict_from_JSON`.
+        ts_sorted (list[float]): sorted timestamps of `data`.
+        model_id (str): model to pack.
+
+    returns:
+        dict[str, np.ndarray]: 'names' (K,), 'coords' (T, K, 2), 'scores' (T, K) with nan for null
+        scores, and 'has' (T, K), True where the pose has that keypoint.
+    """
+
+    rows = [data[ts][model_id][0].kps if data[ts].get(model_id) else None for ts in ts_sorted]
+    names = []
+    for kps in rows:
+        for name in kps or ():
+            if name not in names:
+                names.append(name)
+    kp_idx = {name: k for k, name in enumerate(names)}
+
+    coords = np.full((len(rows), len(names), 2), np.nan)
+    scores = np.full((len(rows), len(names)), np.nan)
+    has = np.zeros((len(rows), len(names)), dtype=bool)
+    for t, kps in enumerate(rows):
+        for name, kp in (kps or {}).items():
+            k = kp_idx[name]
+            has[t, k] = True
+            coords[t, k] = [np.nan if c is None else c for c in kp.coords[:2]]
+            scores[t, k] = np.nan if kp.prob is None else kp.prob
+    return {'names': np.array(names, dtype=str), 'coords': coords, 'scores': scores, 'has': has}
+
+def kps_rows_from_arrays(arrays):
+    """
+    rebuild the per-timestamp keypoint dicts the analyzer functions take from `pose_arrays` output.
+
+    params:
+        arrays (dict[str, np.ndarray]): output of `pose_arrays`.
+
+    returns:
+        list[dict[str, KP2D] or None]: keypoints for each timestamp, None where the model has no pose.
+    """
+
+    names = arrays['names'].tolist()
+    coords, scores, has = arrays['coords'].tolist(), arrays['scores'].tolist(), arrays['has']
+    rows = []
+    for t in range(len(has)):
+        kps = {}
+        for k in np.flatnonzero(has[t]).tolist():
+            score = scores[t][k]
+            kps[names[k]] = KP2D(x=coords[t][k][0], y=coords[t][k][1],
+                                 score=None if score != score else score, name=names[k])
+        rows.append(kps or None)
+    return rows
+
+class FeatureCache:
+    """
+    on-disk memoization of per-session feature columns. each column is stored on its own, keyed
+    by the session content hash and the column's definition/parameters, so changing one check only
+    recomputes that column. the parsed keypoints of every model are cached too (see `pose_arrays`),
+    so new columns are computed without re-parsing the session JSON. the cache is bounded in size
+    and evicts least recently used files. sizes are tracked in memory after one initial scan, so
+    files written to `cache_dir` by another process are only seen by a new `FeatureCache`.
+
+    attributes:
+        cache_dir (Path): directory the columns are stored in.
+        max_bytes (int): size the cache is trimmed back to after writes.
+        hits (int): number of columns served from disk.
+        misses (int): number of columns computed.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # (path, size, mtime) -> content hash, to avoid re-hashing unchanged files
+        self._hashes = {}
+        # path -> [last used, size] for every cached file
+        self._entries = {}
+        for path in self._cached_files():
+            stat = path.stat()
+            self._entries[path] = [stat.st_mtime, stat.st_size]
+        self._total = sum(size for _, size in self._entries.values())
+
+    def _cached_files(self):
+        return [p for p in self.cache_dir.rglob('*') if p.suffix in ('.npy', '.npz')]
+
+    def _track(self, path):
+        stat = path.stat()
+        old = self._entries.get(path)
+        self._total += stat.st_size - (old[1] if old else 0)
+        self._entries[path] = [stat.st_mtime, stat.st_size]
+
+    def _session_hash(self, filepath):
+        stat = os.stat(filepath)
+        key = (str(Path(filepath).resolve()), stat.st_size, stat.st_mtime_ns)
+        if key not in self._hashes:
+            self._hashes[key] = session_hash(filepath)
+        return self._hashes[key]
+
+    def _column_path(self, shash, key):
+        return self.cache_dir / shash / f'{key}.npy'
+
+    def _poses_path(self, shash, model_id):
+        key = hashlib.sha256(json.dumps(['poses', model_id]).encode()).hexdigest()[:32]
+        return self.cache_dir / shash / f'poses_{key}.npz'
+
+    def _load(self, path):
+        if path not in self._entries:
+            return None
+        try:
+            if path.suffix == '.npz':
+                with np.load(path) as npz:
+                    values = {k: npz[k] for k in npz.files}
+            else:
+                values = np.load(path)
+        except (OSError, ValueError):
+            # removed or truncated behind our back; forget it so the size total stays right
+            self._total -= self._entries.pop(path)[1]
+            return None
+        # touch so eviction sees this file as recently used
+        os.utime(path)
+        self._entries[path][0] = time.time()
+        return values
+
+    def _store(self, path, values):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'wb') as f:
+            if isinstance(values, dict):
+                np.savez(f, **values)
+            else:
+                np.save(f, values)
+        os.replace(tmp_path, path)
+        self._track(path)
+
+    def _parse_session(self, filepath, shash, model_id):
+        """
+        parse a session JSON and cache its timestamps and the packed poses of every model, plus
+        `model_id` even when it has no predictions in the session.
+
+        returns:
+            tuple: timestamps array, {model id: `pose_arrays` output}.
+        """
+
+        data, _ = parser.clean_dict_from_JSON(filepath)
+        ts_sorted = sorted(data.keys())
+        timestamps = np.array(ts_sorted, dtype=np.float64)
+        self._store(self._column_path(shash, 'timestamps'), timestamps)
+        models = {m for preds in data.values() for m in preds} | {model_id}
+        packed = {}
+        for m in models:
+            packed[m] = pose_arrays(data, ts_sorted, m)
+            self._store(self._poses_path(shash, m), packed[m])
+        return timestamps, packed
+
+    def get_features(self, filepath, model_id, columns=None):
+        """
+        get feature columns for one session, computing only the columns that are not cached.
+        missing columns are computed from the cached keypoint arrays; the session JSON is only
+        parsed the first time the session is seen (or after its arrays were evicted).
+
+        params:
+            filepath (str): path to the session JSON file.
+            model_id (str): model whose first pose per timestamp is used, as in `parser.get_data_at_time`.
+            columns (list[tuple], optional): column specs. Defaults to `default_columns()`.
+                repeated specs are computed and returned once.
+
+        returns:
+            dict[str, np.ndarray]: 'timestamp' plus one array per unique column name, in first-seen
+            order, aligned row by row over the session's sorted timestamps.
+        """
+
+        columns = default_columns() if columns is None else dedupe_columns(columns)
+        shash = self._session_hash(filepath)
+        ts_path = self._column_path(shash, 'timestamps')
+
+        result = {}
+        missing = []
+        timestamps = self._load(ts_path)
+        for column in columns:
+            path = self._column_path(shash, column_key(column, model_id))
+            values = self._load(path)
+            if values is None:
+                missing.append(column)
+            else:
+                result[column_name(column)] = values
+
+        if timestamps is None or missing:
+            with instr.timer('cache.recompute'):
+                arrays = self._load(self._poses_path(shash, model_id)) if timestamps is not None else None
+                if arrays is None:
+                    instr.count('cache.sessions_parsed')
+                    timestamps, packed = self._parse_session(filepath, shash, model_id)
+                    arrays = packed[model_id]
+                kps_rows = kps_rows_from_arrays(arrays)
+                for column in missing:
+                    values = compute_column(kps_rows, column)
+                    self._store(self._column_path(shash, column_key(column, model_id)), values)
+                    result[column_name(column)] = values
+            self.evict()
+
+        self.hits += len(columns) - len(missing)
+        self.misses += len(missing)
+        instr.count('cache.hits', len(columns) - len(missing))
+        instr.count('cache.misses', len(missing))
+
+        # keep the requested column order
+        ordered = {'timestamp': timestamps}
+        for column in columns:
+            ordered[column_name(column)] = result[column_name(column)]
+        return ordered
+
+    def get_corpus_features(self, filepaths, model_id, columns=None):
+        """
+        get feature columns for every session in a corpus. see `get_features`.
+
+        params:
+            filepaths (list[str]): paths to the session JSON files.
+            model_id (str): model whose poses are used.
+            columns (list[tuple], optional): column specs. Defaults to `default_columns()`.
+
+        returns:
+            dict[str, dict[str, np.ndarray]]: per-file feature columns, keyed by file path.
+        """
+
+        return {str(fp): self.get_features(fp, model_id, columns) for fp in filepaths}
+
+    def size(self):
+        """
+        returns:
+            int: total bytes currently used by cached files.
+        """
+
+        return self._total
+
+    def evict(self):
+        """
+        if the cache is over `max_bytes`, delete least recently used files until it is under
+        `EVICT_TO` of it. a no-op check otherwise.
+
+        returns:
+            int: number of files removed.
+        """
+
+        if self._total <= self.max_bytes:
+            return 0
+        target = self.max_bytes * EVICT_TO
+        removed = 0
+        for path, (_, size) in sorted(self._entries.items(), key=lambda item: item[1][0]):
+            if self._total <= target:
+                break
+            path.unlink(missing_ok=True)
+            del self._entries[path]
+            self._total -= size
+            removed += 1
+            if not any(path.parent.iterdir()):
+                path.parent.rmdir()
+        instr.count('cache.evicted', removed)
+        return removed
+
+    def clear(self):
+        """
+        delete every cached file.
+        """
+
+        for p in self._cached_files():
+            p.unlink()
+        self._entries = {}
+        self._total = 0
+        for d in self.cache_dir.iterdir():
+            if d.is_dir() and not any(d.iterdir()):
+                d.rmdir()
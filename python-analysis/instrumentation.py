@@ -0,0 +1,342 @@
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+class _State:
+    """
+    module-level instrumentation state. a single instance (`_state`) is shared by every hook so
+    the disabled check is one attribute lookup.
+
+    attributes:
+        enabled (bool): whether timers, counters and gauges record anything.
+        timers (dict[str, list[float]]): [calls, total, min, max] wall time in seconds per timer.
+        counters (dict[str, int]): running totals per counter.
+        gauges (dict[str, dict]): last and max value per gauge.
+        profiler (cProfile.Profile or None): active profiler, if profiling was requested.
+        tracing (bool): whether tracemalloc was started by `enable`.
+        started (float or None): perf_counter value when the run was enabled.
+        elapsed (float): total enabled wall time in seconds.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.profiler = None
+        self.tracing = False
+        self.reset()
+
+    def reset(self):
+        self.timers = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.perf_counter() if self.enabled else None
+        self.elapsed = 0.0
+
+_state = _State()
+
+class _NullTimer:
+    """
+    shared no-op context manager handed out by `timer` while instrumentation is disabled.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_TIMER = _NullTimer()
+
+class _Timer:
+    """
+    context manager that adds the wall time of its block to the named timer.
+
+    attributes:
+        name (str): name of the timer being recorded.
+        start (float): perf_counter value on entry.
+    """
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record_time(self.name, time.perf_counter() - self.start)
+        return False
+
+def _record_time(name, elapsed):
+    entry = _state.timers.get(name)
+    if entry is None:
+        _state.timers[name] = [1, elapsed, elapsed, elapsed]
+    else:
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = min(entry[2], elapsed)
+        entry[3] = max(entry[3], elapsed)
+
+def enable(profile=False, trace_memory=False):
+    """
+    turn instrumentation on, optionally with cProfile and/or tracemalloc capture.
+
+    params:
+        profile (bool, optional): run cProfile until `disable` is called. Defaults to False.
+        trace_memory (bool, optional): run tracemalloc until `disable` is called. Defaults to False.
+    """
+
+    _state.enabled = True
+    _state.started = time.perf_counter()
+    if profile:
+        if _state.profiler is None:
+            _state.profiler = cProfile.Profile()
+        _state.profiler.enable()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _state.tracing = True
+
+def disable():
+    """
+    turn instrumentation off. recorded values are kept until `reset` is called, so the summary
+    can still be exported; a later `enable` keeps adding to them.
+    """
+
+    if _state.enabled and _state.started is not None:
+        _state.elapsed += time.perf_counter() - _state.started
+        _state.started = None
+    _state.enabled = False
+    if _state.profiler is not None:
+        _state.profiler.disable()
+
+def reset():
+    """
+    clear all recorded timers, counters, gauges and any profiler/tracemalloc capture.
+    """
+
+    if _state.tracing:
+        tracemalloc.stop()
+        _state.tracing = False
+    if _state.profiler is not None:
+        # an enabled profiler stays installed as the profile hook even once dropped
+        _state.profiler.disable()
+        _state.profiler = None
+    _state.reset()
+
+def is_enabled():
+    """
+    returns:
+        bool: whether instrumentation is currently recording.
+    """
+
+    return _state.enabled
+
+def timer(name):
+    """
+    context manager timing a block under `name`. returns a shared no-op object while disabled.
+
+    params:
+        name (str): timer name, conventionally `<stage>.<step>` (e.g. 'parse.load_json').
+
+    returns:
+        context manager recording the block's wall time.
+    """
+
+    if not _state.enabled:
+        return _NULL_TIMER
+    return _Timer(name)
+
+def timed(name=None):
+    """
+    decorator timing every call of the wrapped function. while disabled the wrapper only adds
+    a single flag check before calling through.
+
+    params:
+        name (str, optional): timer name. Defaults to the function's module and name.
+
+    returns:
+        callable: the decorator.
+    """
+
+    def decorator(fn):
+        timer_name = name or f'{fn.__module__}.{fn.__name__}'
+
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _state.enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record_time(timer_name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def count(name, n=1):
+    """
+    add `n` to the named counter.
+
+    params:
+        name (str): counter name (e.g. 'parse.keypoints').
+        n (int, optional): amount to add. Defaults to 1.
+    """
+
+    if not _state.enabled:
+        return
+    _state.counters[name] = _state.counters.get(name, 0) + n
+
+def gauge(name, value):
+    """
+    record the current value of the named gauge, keeping track of its maximum.
+
+    params:
+        name (str): gauge name.
+        value (float): current value.
+    """
+
+    if not _state.enabled:
+        return
+    entry = _state.gauges.get(name)
+    if entry is None:
+        _state.gauges[name] = {'last': value, 'max': value}
+    else:
+        entry['last'] = value
+        entry['max'] = max(entry['max'], value)
+
+def gauge_memory(name):
+    """
+    record memory use after a stage. when tracemalloc is running, the traced python allocations
+    go under the stage gauge `<name>.mem_kb`. otherwise only the process-wide peak resident set
+    size is available, which says nothing about a single stage, so it is recorded once under
+    `process.peak_rss_kb` (on platforms that provide it).
+
+    params:
+        name (str): stage name the memory reading belongs to.
+    """
+
+    if not _state.enabled:
+        return
+    if tracemalloc.is_tracing():
+        current, _ = tracemalloc.get_traced_memory()
+        gauge(f'{name}.mem_kb', current / 1024)
+        return
+    try:
+        # unix only
+        import resource
+    except ImportError:
+        return
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on linux
+    gauge('process.peak_rss_kb', maxrss / 1024 if sys.platform == 'darwin' else maxrss)
+
+def summary(top=20):
+    """
+    build a per-run summary of everything recorded so far.
+
+    params:
+        top (int, optional): number of profiler functions and allocation sites to include. Defaults to 20.
+
+    returns:
+        dict: elapsed time, timers (calls, total/mean/min/max), counters, gauges, and the
+        profile/memory captures when they were requested.
+    """
+
+    elapsed = _state.elapsed
+    if _state.enabled and _state.started is not None:
+        elapsed += time.perf_counter() - _state.started
+
+    timers = {}
+    for name, (calls, total, t_min, t_max) in sorted(_state.timers.items()):
+        timers[name] = {
+            'calls': calls,
+            'total_s': total,
+            'mean_ms': total / calls * 1000,
+            'min_ms': t_min * 1000,
+            'max_ms': t_max * 1000
+        }
+
+    result = {
+        'elapsed_s': elapsed,
+        'timers': timers,
+        'counters': dict(sorted(_state.counters.items())),
+        'gauges': dict(sorted(_state.gauges.items()))
+    }
+
+    if _state.profiler is not None:
+        buf = io.StringIO()
+        stats = pstats.Stats(_state.profiler, stream=buf)
+        stats.sort_stats('cumulative').print_stats(top)
+        result['profile'] = buf.getvalue()
+
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+        result['memory'] = {
+            'current_kb': current / 1024,
+            'peak_kb': peak / 1024,
+            'top_allocations': [str(s) for s in snapshot.statistics('lineno')[:top]]
+        }
+    return result
+
+def export_summary(filepath, top=20):
+    """
+    write `summary()` to a JSON file.
+
+    params:
+        filepath (str): path of the JSON file to write.
+        top (int, optional): see `summary`. Defaults to 20.
+    """
+
+    Path(filepath).parent.mkdir(parents=True, exist_ok=True)
+    with open(filepath, 'w') as f:
+        json.dump(summary(top), f, indent=4)
+
+def print_summary(top=20):
+    """
+    print timers and counters in the repo's `[LOGGING: ...]` style.
+
+    params:
+        top (int, optional): number of timers to print, slowest total first. Defaults to 20.
+    """
+
+    result = summary(top)
+    print(f"[LOGGING: instrumentation] elapsed: {result['elapsed_s']:.3f}s")
+    by_total = sorted(result['timers'].items(), key=lambda item: item[1]['total_s'], reverse=True)
+    for name, t in by_total[:top]:
+        print(f"[LOGGING: instrumentation] {name}: {t['calls']} calls, {t['total_s']:.4f}s total, {t['mean_ms']:.3f}ms mean")
+    for name, value in result['counters'].items():
+        print(f'[LOGGING: instrumentation] {name}: {value}')
+
+@contextmanager
+def run(export_path=None, profile=False, trace_memory=False, verbose=False):
+    """
+    instrument a block: resets state, enables recording for the block, then disables it and
+    optionally exports/prints the summary.
+
+    params:
+        export_path (str, optional): JSON file the summary is written to. Defaults to None.
+        profile (bool, optional): capture a cProfile profile. Defaults to False.
+        trace_memory (bool, optional): capture tracemalloc statistics. Defaults to False.
+        verbose (bool, optional): print the summary when the block exits. Defaults to False.
+    """
+
+    reset()
+    enable(profile=profile, trace_memory=trace_memory)
+    try:
+        yield
+    finally:
+        disable()
+        if export_path:
+            export_summary(export_path)
+        if verbose:
+            print_summary()
+        reset()
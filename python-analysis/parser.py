@@ -3,7 +3,9 @@ import json
 import cv2 as cv
 from pathlib import Path
 import video_utils as vidutils
+import instrumentation as instr
 
+@instr.timed('parse.clean_dict_from_JSON')
 def clean_dict_from_JSON(filepath: str):
     """
     load and clean a json file, converting it into a dictionary of poses indexed by timestamp.
@@ -19,56 +21,79 @@ def clean_dict_from_JSON(filepath: str):
     """
 
     # open json for parsing and processing
-    with open(filepath, 'r') as f:
+    with instr.timer('parse.load_json'), open(filepath, 'r') as f:
         parsed = json.load(f)
+    instr.gauge_memory('parse.load_json')
 
-    formatted = {}
-    max_ts = -1
+    formatted, max_ts = clean_dict_from_entries(parsed)
 
-    for entry in parsed:
-        for pred in entry:
-            timestamp = pred['timeStamp']
-            
-            # update max_ts if current timestamp is greater
-            if timestamp > max_ts:
-                max_ts = timestamp
-
-            model_id = pred['modelId']
-            pose_data = pred['poseData']
-            pose_items = []
-            cur_pose = None
-
-            for pose in pose_data:
-                kp_items = {}
-                overall_score = pose['score']
-                for kp in pose['keypoints']:
-                    name = kp['name']
-                    # create KP2D object for each keypoint
-                    kp_items[name] = KP2D(x = kp['x'], y = kp['y'], score = kp['score'], name = kp['name'])
-                
-                if 'keypoints3D' in pose:
-                    kp3d_items = {}
-                    for kp3d in pose['keypoints3D']:
-                        name = kp3d['name']
-                        # create KP3D object for each 3D keypoint
-                        kp3d_items[name] = KP3D(x = kp3d['x'], y = kp3d['y'], z = kp3d['z'], score = kp3d['score'], name = kp3d['name'])
-                    cur_pose = Pose3D(overall_score, kp_items, kp3d_items)
-                else:
-                    cur_pose = Pose(overall_score, kp_items)
-                pose_items.append(cur_pose)
-
-            # initialize empty dict for new timestamp
-            if not timestamp in formatted:
-                formatted[timestamp] = {}
-            if not model_id in formatted[timestamp]:
-                formatted[timestamp][model_id] = pose_items
-    
     # optional dump into json
     # print(json.dumps(parsed, indent=4))
     # with open('output.json', 'w') as f:
     #     json.dump(parsed, f, indent=4)
     return formatted, max_ts
 
+def clean_dict_from_entries(parsed):
+    """
+    convert already loaded session entries (the JSON structure described in the README) into a
+    dictionary of poses indexed by timestamp.
+
+    params:
+        parsed (list[list[dict]]): session entries, one inner list of model predictions per frame.
+
+    returns:
+        tuple: (formatted, max_ts), as returned by `clean_dict_from_JSON`.
+    """
+
+    formatted = {}
+    max_ts = -1
+
+    with instr.timer('parse.build_poses'):
+        for entry in parsed:
+            for pred in entry:
+                timestamp = pred['timeStamp']
+            
+                # update max_ts if current timestamp is greater
+                if timestamp > max_ts:
+                    max_ts = timestamp
+
+                model_id = pred['modelId']
+                pose_data = pred['poseData']
+                pose_items = []
+                cur_pose = None
+
+                for pose in pose_data:
+                    kp_items = {}
+                    overall_score = pose['score']
+                    for kp in pose['keypoints']:
+                        name = kp['name']
+                        # create KP2D object for each keypoint
+                        kp_items[name] = KP2D(x = kp['x'], y = kp['y'], score = kp['score'], name = kp['name'])
+                
+                    if 'keypoints3D' in pose:
+                        kp3d_items = {}
+                        for kp3d in pose['keypoints3D']:
+                            name = kp3d['name']
+                            # create KP3D object for each 3D keypoint
+                            kp3d_items[name] = KP3D(x = kp3d['x'], y = kp3d['y'], z = kp3d['z'], score = kp3d['score'], name = kp3d['name'])
+                        cur_pose = Pose3D(overall_score, kp_items, kp3d_items)
+                    else:
+                        cur_pose = Pose(overall_score, kp_items)
+                    pose_items.append(cur_pose)
+
+                # initialize empty dict for new timestamp
+                if not timestamp in formatted:
+                    formatted[timestamp] = {}
+                if not model_id in formatted[timestamp]:
+                    formatted[timestamp][model_id] = pose_items
+
+    if instr.is_enabled():
+        instr.count('parse.predictions', sum(len(entry) for entry in parsed))
+        instr.count('parse.timestamps', len(formatted))
+        instr.gauge_memory('parse.build_poses')
+    return formatted, max_ts
+
+@instr.timed('lookup.get_data_at_time')
 def get_data_at_time(data, timestamp, model_id):
     """
     retrieve keypoint data at the closest timestamp to the requested one.
@@ -88,12 +113,15 @@ def get_data_at_time(data, timestamp, model_id):
     closest_timestamp = min(all_ts, key=lambda x: abs(x - timestamp))
     # print(f'[LOGGING]: get_data_for_frame] requested: {timestamp} closest: {closest_timestamp}')
     if model_id not in data[closest_timestamp]:
+        instr.count('lookup.missing_model')
         return None
     poses = data[closest_timestamp][model_id]
     if abs(closest_timestamp - timestamp) > 3:
+        instr.count('lookup.large_diff')
         print(f'[FLAG] diff between requested and returned frames is unexpectedly large.')
     return poses[0].kps
 
+@instr.timed('render.draw_pose_on_frame')
 def draw_pose_on_frame(frame, kps, kp_mapping=None, skeleton_list=None):
     """
     draw keypoints and skeleton connections on a frame.
@@ -112,8 +140,8 @@ def draw_pose_on_frame(frame, kps, kp_mapping=None, skeleton_list=None):
     """
 
     for kp in kps.values():
-        # print(f'[LOGGING: draw_pose_on_frame] xpos: {kp.x} ypos: {kp.y}')
-        cv.circle(frame, (int(kp.x), int(kp.y)), 1, (0, 0, 255), -1)
+        # print(f'[LOGGING: draw_pose_on_frame] xpos: {kp.coords[0]} ypos: {kp.coords[1]}')
+        cv.circle(frame, (int(kp.coords[0]), int(kp.coords[1])), 1, (0, 0, 255), -1)
 
     if not skeleton_list or not kp_mapping:
         return None
@@ -0,0 +1,677 @@
+import parser
+from definitions import Pose, Pose3D, KP2D, KP3D
+import instrumentation as instr
+import json
+import os
+import struct
+import zlib
+import numpy as np
+
+try:
+    import zstandard as zstd
+except ImportError:
+    zstd = None
+
+# file layout:
+#   magic (4s) | version (H) | header length (I) | header JSON
+#   chunk payloads, each compressed independently
+#   chunk index (INDEX_DTYPE records)
+#   footer: index offset (Q) | chunk count (I) | magic (4s)
+MAGIC = b'PSBN'
+INDEX_MAGIC = b'PSIX'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+FOOTER = struct.Struct('<QI4s')
+CHUNK_COUNTS = struct.Struct('<5I')
+
+INDEX_DTYPE = np.dtype([
+    ('t_start', '<f8'),
+    ('t_end', '<f8'),
+    ('offset', '<u8'),
+    ('length', '<u8'),
+    ('n_frames', '<u4')
+])
+
+DTYPES = {'float16': np.float16, 'float32': np.float32}
+COMPRESSIONS = ['none', 'zlib', 'zstd']
+
+def _compress(payload, compression, level=None):
+    if compression == 'none':
+        return payload
+    if compression == 'zlib':
+        return zlib.compress(payload, 6 if level is None else level)
+    if zstd is None:
+        raise ImportError('zstd compression requires the `zstandard` package.')
+    return zstd.ZstdCompressor(level=3 if level is None else level).compress(payload)
+
+def _decompress(payload, compression):
+    if compression == 'none':
+        return payload
+    if compression == 'zlib':
+        return zlib.decompress(payload)
+    if zstd is None:
+        raise ImportError('zstd compression requires the `zstandard` package.')
+    return zstd.ZstdDecompressor().decompress(payload)
+
+def _to_float(value):
+    # TFJS keypoint fields may be undefined; store them as nan
+    return np.nan if value is None else value
+
+def _from_float(value):
+    # nan is not valid JSON, so missing values go back to null
+    return None if value != value else value
+
+def _nullable(values):
+    # vectorised `_from_float`: nested lists of python floats with nan replaced by None
+    out = values.astype(np.float64).astype(object)
+    out[np.isnan(values)] = None
+    return out.tolist()
+
+def build_tables(entries):
+    """
+    collect the model ids and per-model keypoint name tables of a session, in first-seen order.
+
+    params:
+        entries (list[list[dict]]): session entries in the README JSON format.
+
+    returns:
+        tuple: (model ids, {model id: 2D keypoint names}, {model id: 3D keypoint names}).
+    """
+
+    models, kp_names, kp3d_names = [], {}, {}
+    for entry in entries:
+        for pred in entry:
+            model_id = pred['modelId']
+            if model_id not in kp_names:
+                models.append(model_id)
+                kp_names[model_id] = []
+                kp3d_names[model_id] = []
+            for pose in pred['poseData']:
+                for kp in pose['keypoints']:
+                    if kp.get('name') not in kp_names[model_id]:
+                        kp_names[model_id].append(kp.get('name'))
+                for kp in pose.get('keypoints3D', []):
+                    if kp.get('name') not in kp3d_names[model_id]:
+                        kp3d_names[model_id].append(kp.get('name'))
+    return models, kp_names, kp3d_names
+
+class PoseWriter:
+    """
+    writer for the compact binary pose container. keypoint names and model ids are written
+    once in the header, frames are buffered and flushed as independently compressed chunks of
+    quantized coordinate/score blocks, and a chunk index is appended on `close` so readers can
+    seek by timestamp. used as a context manager, an exception in the block calls `abort`
+    instead, so no partial file is left behind.
+
+    attributes:
+        filepath (str): path of the file being written.
+        models (list[str]): model ids, in table order.
+        kp_names (dict[str, list[str]]): 2D keypoint names per model.
+        kp3d_names (dict[str, list[str]]): 3D keypoint names per model.
+        dtype (str): 'float32' or 'float16', used for keypoint coordinates and scores.
+        compression (str): 'none', 'zlib' or 'zstd'.
+        chunk_frames (int): number of frames (outer JSON entries) per chunk.
+    """
+
+    def __init__(self, filepath, models, kp_names, kp3d_names=None, dtype='float32',
+                 compression='zlib', chunk_frames=256, level=None):
+        if dtype not in DTYPES:
+            raise ValueError(f'unsupported dtype {dtype}; expected one of {list(DTYPES)}.')
+        if compression not in COMPRESSIONS:
+            raise ValueError(f'unsupported compression {compression}; expected one of {COMPRESSIONS}.')
+        if compression == 'zstd' and zstd is None:
+            raise ImportError('zstd compression requires the `zstandard` package.')
+
+        self.filepath = filepath
+        self.models = list(models)
+        self.kp_names = {m: list(kp_names.get(m, [])) for m in self.models}
+        self.kp3d_names = {m: list((kp3d_names or {}).get(m, [])) for m in self.models}
+        self.dtype = dtype
+        self.compression = compression
+        self.chunk_frames = chunk_frames
+        self.level = level
+
+        self._model_idx = {m: i for i, m in enumerate(self.models)}
+        self._kp_idx = {m: {n: i for i, n in enumerate(names)} for m, names in self.kp_names.items()}
+        self._kp3d_idx = {m: {n: i for i, n in enumerate(names)} for m, names in self.kp3d_names.items()}
+        self._pending = []
+        self._index = []
+
+        header = json.dumps({
+            'models': self.models,
+            'kp_names': self.kp_names,
+            'kp3d_names': self.kp3d_names,
+            'dtype': dtype,
+            'compression': compression,
+            'chunk_frames': chunk_frames
+        }).encode()
+        self._f = open(filepath, 'wb')
+        self._f.write(PREAMBLE.pack(MAGIC, VERSION, len(header)))
+        self._f.write(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # a failed write must not leave a file that reads back as a shorter session
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def write_frame(self, entry):
+        """
+        queue one frame (a list of model predictions in the README JSON format) for writing.
+
+        params:
+            entry (list[dict]): predictions for a single frame.
+        """
+
+        self._pending.append(entry)
+        if len(self._pending) >= self.chunk_frames:
+            self._flush()
+
+    def _encode_chunk(self, frames):
+        vdtype = np.dtype(DTYPES[self.dtype]).newbyteorder('<')
+        frame_sizes, pred_ts, pred_fidx, pred_model, pred_npose = [], [], [], [], []
+        pose_score, pose_nkp, pose_nkp3d = [], [], []
+        kp_idx, kp_vals, kp3d_idx, kp3d_vals = [], [], [], []
+
+        for entry in frames:
+            frame_sizes.append(len(entry))
+            for pred in entry:
+                model_id = pred['modelId']
+                if model_id not in self._model_idx:
+                    raise ValueError(f'model {model_id} missing from the header table.')
+                pred_ts.append(pred['timeStamp'])
+                pred_fidx.append(pred.get('frameIdx', -1))
+                pred_model.append(self._model_idx[model_id])
+                pred_npose.append(len(pred['poseData']))
+                names, names3d = self._kp_idx[model_id], self._kp3d_idx[model_id]
+                for pose in pred['poseData']:
+                    score = pose.get('score')
+                    pose_score.append(_to_float(score))
+                    pose_nkp.append(len(pose['keypoints']))
+                    for kp in pose['keypoints']:
+                        kp_idx.append(names[kp.get('name')])
+                        kp_vals.append(tuple(_to_float(kp.get(k)) for k in ('x', 'y', 'score')))
+                    if 'keypoints3D' in pose:
+                        pose_nkp3d.append(len(pose['keypoints3D']))
+                        for kp in pose['keypoints3D']:
+                            kp3d_idx.append(names3d[kp.get('name')])
+                            kp3d_vals.append(tuple(_to_float(kp.get(k)) for k in ('x', 'y', 'z', 'score')))
+                    else:
+                        # -1 marks a pose without a keypoints3D list, as opposed to an empty one
+                        pose_nkp3d.append(-1)
+
+        blocks = [
+            np.array(frame_sizes, dtype='<u2'),
+            np.array(pred_ts, dtype='<f8'),
+            np.array(pred_fidx, dtype='<i4'),
+            np.array(pred_model, dtype='<u2'),
+            np.array(pred_npose, dtype='<u2'),
+            np.array(pose_score, dtype='<f4'),
+            np.array(pose_nkp, dtype='<u2'),
+            np.array(pose_nkp3d, dtype='<i2'),
+            np.array(kp_idx, dtype='<u2'),
+            np.array(kp_vals, dtype=vdtype).reshape(-1, 3),
+            np.array(kp3d_idx, dtype='<u2'),
+            np.array(kp3d_vals, dtype=vdtype).reshape(-1, 4)
+        ]
+        counts = CHUNK_COUNTS.pack(len(frame_sizes), len(pred_ts), len(pose_score), len(kp_idx), len(kp3d_idx))
+        payload = counts + b''.join(b.tobytes() for b in blocks)
+        t_start = min(pred_ts) if pred_ts else np.nan
+        t_end = max(pred_ts) if pred_ts else np.nan
+        return payload, t_start, t_end
+
+    def _flush(self):
+        if not self._pending:
+            return
+        with instr.timer('binary.write_chunk'):
+            payload, t_start, t_end = self._encode_chunk(self._pending)
+            compressed = _compress(payload, self.compression, self.level)
+            offset = self._f.tell()
+            self._f.write(compressed)
+            self._index.append((t_start, t_end, offset, len(compressed), len(self._pending)))
+        instr.count('binary.chunks_written')
+        self._pending = []
+
+    def close(self):
+        """
+        flush any buffered frames and write the chunk index and footer.
+        """
+
+        if self._f.closed:
+            return
+        self._flush()
+        index_offset = self._f.tell()
+        self._f.write(np.array(self._index, dtype=INDEX_DTYPE).tobytes())
+        self._f.write(FOOTER.pack(index_offset, len(self._index), INDEX_MAGIC))
+        self._f.close()
+
+    def abort(self):
+        """
+        discard the file: close it without writing buffered frames or the index, and delete it.
+        """
+
+        if not self._f.closed:
+            self._f.close()
+        self._pending = []
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
+
+class PoseReader:
+    """
+    reader for files written by `PoseWriter`. only the header and chunk index are read on open;
+    chunks are decompressed on demand, so time-range reads only touch the chunks they overlap.
+
+    attributes:
+        filepath (str): path of the file being read.
+        header (dict): models, keypoint name tables, dtype, compression and chunk size.
+        index (np.ndarray): per-chunk t_start, t_end, offset, length and n_frames.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self._f = open(filepath, 'rb')
+        magic, version, header_len = PREAMBLE.unpack(self._f.read(PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f'{filepath} is not a binary pose file.')
+        if version > VERSION:
+            raise ValueError(f'{filepath} has format version {version}; this reader supports up to {VERSION}.')
+        self.header = json.loads(self._f.read(header_len))
+
+        self._f.seek(-FOOTER.size, 2)
+        index_offset, n_chunks, index_magic = FOOTER.unpack(self._f.read(FOOTER.size))
+        if index_magic != INDEX_MAGIC:
+            raise ValueError(f'{filepath} has no chunk index; it may not have been closed properly.')
+        self._f.seek(index_offset)
+        self.index = np.frombuffer(self._f.read(n_chunks * INDEX_DTYPE.itemsize), dtype=INDEX_DTYPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __len__(self):
+        return len(self.index)
+
+    def close(self):
+        self._f.close()
+
+    def read_chunk(self, i):
+        """
+        decompress and decode a single chunk.
+
+        params:
+            i (int): chunk number.
+
+        returns:
+            list[list[dict]]: the chunk's frames in the README JSON format.
+        """
+
+        with instr.timer('binary.read_chunk'):
+            frames = self._decode_chunk(self._chunk_arrays(i))
+        instr.count('binary.chunks_read')
+        return frames
+
+    def _chunk_arrays(self, i):
+        rec = self.index[i]
+        self._f.seek(int(rec['offset']))
+        payload = _decompress(self._f.read(int(rec['length'])), self.header['compression'])
+
+        vdtype = np.dtype(DTYPES[self.header['dtype']]).newbyteorder('<')
+        n_frames, n_preds, n_poses, n_kps, n_kps3d = CHUNK_COUNTS.unpack_from(payload)
+        pos = CHUNK_COUNTS.size
+
+        def take(dtype, count, width=1):
+            nonlocal pos
+            dtype = np.dtype(dtype)
+            arr = np.frombuffer(payload, dtype=dtype, count=count * width, offset=pos)
+            pos += dtype.itemsize * count * width
+            return arr.reshape(-1, width) if width > 1 else arr
+
+        frame_sizes = take('<u2', n_frames)
+        pred_ts = take('<f8', n_preds)
+        pred_fidx = take('<i4', n_preds)
+        pred_model = take('<u2', n_preds)
+        pred_npose = take('<u2', n_preds)
+        pose_score = take('<f4', n_poses)
+        pose_nkp = take('<u2', n_poses)
+        pose_nkp3d = take('<i2', n_poses)
+        kp_idx = take('<u2', n_kps)
+        kp_vals = take(vdtype, n_kps, 3).astype(np.float64)
+        kp3d_idx = take('<u2', n_kps3d)
+        kp3d_vals = take(vdtype, n_kps3d, 4).astype(np.float64)
+        return (frame_sizes, pred_ts, pred_fidx, pred_model, pred_npose, pose_score, pose_nkp, pose_nkp3d,
+                kp_idx, kp_vals, kp3d_idx, kp3d_vals)
+
+    def _decode_chunk(self, arrays):
+        (frame_sizes, pred_ts, pred_fidx, pred_model, pred_npose, pose_score, pose_nkp, pose_nkp3d,
+         kp_idx, kp_vals, kp3d_idx, kp3d_vals) = arrays
+        kp_vals, kp3d_vals = kp_vals.tolist(), kp3d_vals.tolist()
+
+        models = self.header['models']
+        kp_names, kp3d_names = self.header['kp_names'], self.header['kp3d_names']
+        frames = []
+        p_i = pose_i = k_i = k3_i = 0
+        for n_pred in frame_sizes.tolist():
+            entry = []
+            for _ in range(n_pred):
+                model_id = models[pred_model[p_i]]
+                names, names3d = kp_names[model_id], kp3d_names[model_id]
+                pose_data = []
+                for _ in range(int(pred_npose[p_i])):
+                    pose = {'score': _from_float(float(pose_score[pose_i])), 'keypoints': []}
+                    for _ in range(int(pose_nkp[pose_i])):
+                        x, y, s = map(_from_float, kp_vals[k_i])
+                        pose['keypoints'].append({'x': x, 'y': y, 'score': s, 'name': names[kp_idx[k_i]]})
+                        k_i += 1
+                    if pose_nkp3d[pose_i] >= 0:
+                        pose['keypoints3D'] = []
+                        for _ in range(int(pose_nkp3d[pose_i])):
+                            x, y, z, s = map(_from_float, kp3d_vals[k3_i])
+                            pose['keypoints3D'].append({'x': x, 'y': y, 'z': z, 'score': s, 'name': names3d[kp3d_idx[k3_i]]})
+                            k3_i += 1
+                    pose_data.append(pose)
+                    pose_i += 1
+                pred = {'timeStamp': float(pred_ts[p_i]), 'modelId': model_id, 'poseData': pose_data}
+                if pred_fidx[p_i] >= 0:
+                    pred['frameIdx'] = int(pred_fidx[p_i])
+                entry.append(pred)
+                p_i += 1
+            frames.append(entry)
+        return frames
+
+    def chunks_between(self, t_start=None, t_end=None):
+        """
+        find the chunks overlapping a time range using only the chunk index.
+
+        params:
+            t_start (float, optional): range start in seconds. Defaults to the start of the file.
+            t_end (float, optional): range end in seconds. Defaults to the end of the file.
+
+        returns:
+            np.ndarray: chunk numbers, in file order.
+        """
+
+        overlap = np.ones(len(self.index), dtype=bool)
+        if t_start is not None:
+            overlap &= self.index['t_end'] >= t_start
+        if t_end is not None:
+            overlap &= self.index['t_start'] <= t_end
+        return np.nonzero(overlap)[0]
+
+    def iter_frames(self, t_start=None, t_end=None):
+        """
+        lazily yield frames, decompressing only chunks that overlap [t_start, t_end]. when a range
+        is given, frames whose predictions all fall outside it are skipped; without one every
+        frame is yielded as stored, including empty ones.
+
+        params:
+            t_start (float, optional): range start in seconds. Defaults to the start of the file.
+            t_end (float, optional): range end in seconds. Defaults to the end of the file.
+
+        returns:
+            generator of list[dict], one frame at a time in the README JSON format.
+        """
+
+        ranged = t_start is not None or t_end is not None
+        lo = -np.inf if t_start is None else t_start
+        hi = np.inf if t_end is None else t_end
+        for i in self.chunks_between(t_start, t_end):
+            for entry in self.read_chunk(i):
+                if not ranged:
+                    yield entry
+                    continue
+                entry = [pred for pred in entry if lo <= pred['timeStamp'] <= hi]
+                if entry:
+                    yield entry
+
+    def read_entries(self, t_start=None, t_end=None):
+        """
+        params:
+            t_start (float, optional): range start in seconds. Defaults to the start of the file.
+            t_end (float, optional): range end in seconds. Defaults to the end of the file.
+
+        returns:
+            list[list[dict]]: frames in the range, in the README JSON format.
+        """
+
+        return list(self.iter_frames(t_start, t_end))
+
+    def read_poses(self, t_start=None, t_end=None):
+        """
+        build `Pose`/`Pose3D` objects straight from the decoded chunk arrays, skipping the
+        intermediate JSON-like dicts that `read_entries` produces.
+
+        params:
+            t_start (float, optional): range start in seconds. Defaults to the start of the file.
+            t_end (float, optional): range end in seconds. Defaults to the end of the file.
+
+        returns:
+            tuple: (formatted, max_ts), as returned by `parser.clean_dict_from_JSON`.
+        """
+
+        lo = -np.inf if t_start is None else t_start
+        hi = np.inf if t_end is None else t_end
+        models = self.header['models']
+        kp_names = [self.header['kp_names'][m] for m in models]
+        kp3d_names = [self.header['kp3d_names'][m] for m in models]
+
+        formatted = {}
+        max_ts = -1
+        n_preds = 0
+        for i in self.chunks_between(t_start, t_end):
+            with instr.timer('binary.read_chunk'):
+                (_, pred_ts, _, pred_model, pred_npose, pose_score, pose_nkp, pose_nkp3d,
+                 kp_idx, kp_vals, kp3d_idx, kp3d_vals) = self._chunk_arrays(i)
+            instr.count('binary.chunks_read')
+
+            with instr.timer('binary.build_poses'):
+                # start offset of every pose's keypoints; a -1 keypoints3D count holds none
+                kp_start = [0] + np.cumsum(pose_nkp, dtype=np.int64).tolist()
+                kp3d_start = [0] + np.cumsum(np.maximum(pose_nkp3d, 0), dtype=np.int64).tolist()
+                has_3d = (pose_nkp3d >= 0).tolist()
+                # one flat list per field is cheaper to build than a list per keypoint
+                pose_score = _nullable(pose_score)
+                xs, ys, scores = _nullable(kp_vals.T)
+                xs3d, ys3d, zs3d, scores3d = _nullable(kp3d_vals.T)
+                kp_idx, kp3d_idx = kp_idx.tolist(), kp3d_idx.tolist()
+
+                pose_i = 0
+                for ts, m, n_pose in zip(pred_ts.tolist(), pred_model.tolist(), pred_npose.tolist()):
+                    first = pose_i
+                    pose_i += n_pose
+                    if not lo <= ts <= hi:
+                        continue
+                    n_preds += 1
+                    if ts > max_ts:
+                        max_ts = ts
+                    model_id = models[m]
+                    preds = formatted.setdefault(ts, {})
+                    # like the JSON parse, the first prediction of a model at a timestamp wins
+                    if model_id in preds:
+                        continue
+
+                    names, names3d = kp_names[m], kp3d_names[m]
+                    pose_items = []
+                    for j in range(first, pose_i):
+                        kps = {}
+                        for k in range(kp_start[j], kp_start[j + 1]):
+                            name = names[kp_idx[k]]
+                            kps[name] = KP2D(xs[k], ys[k], scores[k], name)
+                        if has_3d[j]:
+                            kps3d = {}
+                            for k in range(kp3d_start[j], kp3d_start[j + 1]):
+                                name = names3d[kp3d_idx[k]]
+                                kps3d[name] = KP3D(xs3d[k], ys3d[k], zs3d[k], scores3d[k], name)
+                            pose_items.append(Pose3D(pose_score[j], kps, kps3d))
+                        else:
+                            pose_items.append(Pose(pose_score[j], kps))
+                    preds[model_id] = pose_items
+
+        if instr.is_enabled():
+            instr.count('parse.predictions', n_preds)
+            instr.count('parse.timestamps', len(formatted))
+            instr.gauge_memory('binary.build_poses')
+        return formatted, max_ts
+
+def json_to_binary(json_path, bin_path, dtype='float32', compression='zlib', chunk_frames=256, level=None):
+    """
+    convert a session JSON file into the binary container.
+
+    params:
+        json_path (str): path to the session JSON file.
+        bin_path (str): path of the binary file to write.
+        dtype (str, optional): 'float32' or 'float16' for coordinates and scores. Defaults to 'float32'.
+        compression (str, optional): 'none', 'zlib' or 'zstd'. Defaults to 'zlib'.
+        chunk_frames (int, optional): frames per chunk. Defaults to 256.
+        level (int, optional): compression level; codec default if None.
+    """
+
+    with open(json_path, 'r') as f:
+        entries = json.load(f)
+    entries_to_binary(entries, bin_path, dtype, compression, chunk_frames, level)
+
+def entries_to_binary(entries, bin_path, dtype='float32', compression='zlib', chunk_frames=256, level=None):
+    """
+    write already loaded session entries into the binary container. see `json_to_binary`.
+
+    params:
+        entries (list[list[dict]]): session entries in the README JSON format.
+        bin_path (str): path of the binary file to write.
+    """
+
+    models, kp_names, kp3d_names = build_tables(entries)
+    with PoseWriter(bin_path, models, kp_names, kp3d_names, dtype, compression, chunk_frames, level) as writer:
+        for entry in entries:
+            writer.write_frame(entry)
+
+def binary_to_json(bin_path, json_path, t_start=None, t_end=None):
+    """
+    convert a binary container (or a time range of it) back into session JSON readable by
+    `parser.clean_dict_from_JSON`.
+
+    params:
+        bin_path (str): path to the binary file.
+        json_path (str): path of the JSON file to write.
+        t_start (float, optional): range start in seconds. Defaults to the start of the file.
+        t_end (float, optional): range end in seconds. Defaults to the end of the file.
+    """
+
+    with PoseReader(bin_path) as reader:
+        entries = reader.read_entries(t_start, t_end)
+    with open(json_path, 'w') as f:
+        json.dump(entries, f)
+
+def clean_dict_from_binary(bin_path, t_start=None, t_end=None):
+    """
+    load a binary container straight into the same structure `parser.clean_dict_from_JSON` returns,
+    without going through JSON-like dicts.
+
+    params:
+        bin_path (str): path to the binary file.
+        t_start (float, optional): range start in seconds. Defaults to the start of the file.
+        t_end (float, optional): range end in seconds. Defaults to the end of the file.
+
+    returns:
+        tuple: (formatted, max_ts), as returned by `parser.clean_dict_from_JSON`.
+    """
+
+    with PoseReader(bin_path) as reader:
+        return reader.read_poses(t_start, t_end)
+
+
+if __name__ == '__main__':
+    # round-trip check: JSON -> binary -> parsed poses must match the JSON parse within dtype tolerance
+    import benchmark
+    import tempfile
+
+    session = benchmark.generate_session(duration=10, fps=30, models=['movenet', 'blazepose'], persons=2, seed=1)
+    session[5][0]['poseData'][0]['score'] = None
+    session[6][1]['poseData'][1]['keypoints'][3]['score'] = None
+    session[7][1]['poseData'][0]['keypoints3D'][2]['score'] = None
+    session.insert(8, [])
+    # a repeated model at one timestamp: only the first prediction is kept
+    session[9].append(json.loads(json.dumps(session[9][0])))
+    session[9][-1]['poseData'][0]['score'] = 0.0
+
+    def kps_close(kps_a, kps_b, rtol):
+        assert kps_a.keys() == kps_b.keys()
+        for name, kp in kps_a.items():
+            other = kps_b[name]
+            assert (kp.prob is None) == (other.prob is None), name
+            values = kp.coords + ([kp.prob] if kp.prob is not None else [])
+            other_values = other.coords + ([other.prob] if other.prob is not None else [])
+            assert np.allclose(values, other_values, rtol=rtol, atol=1e-6), (name, values, other_values)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        json_path = os.path.join(tmpdir, 'session.json')
+        with open(json_path, 'w') as f:
+            json.dump(session, f)
+        expected, expected_max = parser.clean_dict_from_JSON(json_path)
+
+        # float16 keeps ~11 bits of mantissa: at most 0.25px error below 512px, 0.5px below 1024px
+        for dtype, rtol in [('float32', 1e-6), ('float16', 1e-3)]:
+            bin_path = os.path.join(tmpdir, f'session_{dtype}.psb')
+            json_to_binary(json_path, bin_path, dtype=dtype, chunk_frames=16)
+            actual, actual_max = clean_dict_from_binary(bin_path)
+            assert actual_max == expected_max and actual.keys() == expected.keys()
+            for ts, preds in expected.items():
+                assert preds.keys() == actual[ts].keys()
+                for model_id, poses in preds.items():
+                    assert len(poses) == len(actual[ts][model_id])
+                    for pose, other in zip(poses, actual[ts][model_id]):
+                        assert (pose.score is None) == (other.score is None)
+                        kps_close(pose.kps, other.kps, rtol)
+                        if hasattr(pose, 'kps3d'):
+                            kps_close(pose.kps3d, other.kps3d, rtol)
+
+            # JSON written back must be valid (no NaN) and keep frame grouping, including empty frames
+            rt_path = os.path.join(tmpdir, f'roundtrip_{dtype}.json')
+            binary_to_json(bin_path, rt_path)
+            with open(rt_path, 'r') as f:
+                text = f.read()
+            assert 'NaN' not in text
+            roundtrip = json.loads(text)
+            assert [len(entry) for entry in roundtrip] == [len(entry) for entry in session]
+            print(f'[LOGGING: pose_binary] {dtype} round trip ok ({os.path.getsize(bin_path)} bytes)')
+
+        # seeking by time only touches chunks overlapping the range
+        with PoseReader(os.path.join(tmpdir, 'session_float32.psb')) as reader:
+            selected = reader.chunks_between(3.0, 4.0)
+            assert 0 < len(selected) < len(reader)
+            for i, rec in enumerate(reader.index):
+                overlaps = rec['t_end'] >= 3.0 and rec['t_start'] <= 4.0
+                assert overlaps == (i in selected), i
+            frames = reader.read_entries(3.0, 4.0)
+            assert frames and all(3.0 <= pred['timeStamp'] <= 4.0 for entry in frames for pred in entry)
+            # poses built from the arrays match the ones parsed from the decoded entries
+            direct, direct_max = reader.read_poses(3.0, 4.0)
+            via_entries, entries_max = parser.clean_dict_from_entries(frames)
+            assert direct_max == entries_max and direct.keys() == via_entries.keys()
+            for ts, preds in via_entries.items():
+                for model_id, poses in preds.items():
+                    for pose, other in zip(poses, direct[ts][model_id], strict=True):
+                        assert pose.score == other.score
+                        kps_close(pose.kps, other.kps, 0)
+            print(f'[LOGGING: pose_binary] seek ok ({len(selected)} of {len(reader)} chunks read)')
+
+        # a conversion that fails part way leaves no file behind
+        bad_path = os.path.join(tmpdir, 'bad.psb')
+        bad = json.loads(json.dumps(session))
+        bad[40][0]['modelId'] = 'unknown'
+        try:
+            with PoseWriter(bad_path, *build_tables(session), chunk_frames=16) as writer:
+                for entry in bad:
+                    writer.write_frame(entry)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('unknown model was accepted')
+        assert not os.path.exists(bad_path)
+        print('[LOGGING: pose_binary] failed write removed')
@@ -0,0 +1,343 @@
+import parser
+import instrumentation as instr
+import operator
+import numpy as np
+from bisect import bisect_left, bisect_right
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '==': operator.eq,
+    '!=': operator.ne
+}
+
+class QueryResult:
+    """
+    array form of the poses a query selected for a single model over a run of timestamps.
+    the arrays cover every timestamp/person in the query's range; `mask` marks the rows that
+    pass the query's person and confidence filters. missing persons and keypoints are nan.
+
+    attributes:
+        model_id (str): model the arrays belong to.
+        kp_names (list[str]): keypoint names, in the order of the keypoint axis.
+        ts_keys (list): original timestamp keys into the parsed session, one per row.
+        timestamps (np.ndarray): (T,) timestamps in seconds.
+        coords (np.ndarray): (T, P, K, 2) keypoint x, y coordinates.
+        scores (np.ndarray): (T, P, K) keypoint confidence scores.
+        pose_scores (np.ndarray): (T, P) overall pose scores.
+        mask (np.ndarray): (T, P) boolean, True where a pose exists and passes every filter.
+    """
+
+    def __init__(self, data, model_id, kp_names, ts_keys, timestamps, coords, scores, pose_scores, mask):
+        self._data = data
+        self.model_id = model_id
+        self.kp_names = kp_names
+        self.ts_keys = ts_keys
+        self.timestamps = timestamps
+        self.coords = coords
+        self.scores = scores
+        self.pose_scores = pose_scores
+        self.mask = mask
+
+    def __len__(self):
+        return int(self.mask.sum())
+
+    def kp_index(self, name):
+        """
+        params:
+            name (str): keypoint name.
+
+        returns:
+            int: index of the keypoint along the keypoint axis.
+        """
+
+        return self.kp_names.index(name)
+
+    def rows(self):
+        """
+        returns:
+            tuple[np.ndarray, np.ndarray]: time and person indices of every selected pose.
+        """
+
+        return np.nonzero(self.mask)
+
+    def iter_poses(self):
+        """
+        lazily yield the selected poses as the `Pose` objects held in the parsed session.
+
+        returns:
+            generator of (timestamp, person index, Pose) tuples.
+        """
+
+        t_idx, p_idx = self.rows()
+        for t, p in zip(t_idx, p_idx):
+            ts_key = self.ts_keys[t]
+            yield ts_key, int(p), self._data[ts_key][self.model_id][p]
+
+class SessionQuery:
+    """
+    query over a parsed session (see `parser.clean_dict_from_JSON`), built by chaining filters:
+
+        SessionQuery(data).model('movenet').between(120, 180).where('left_knee', '<', 0.3)
+
+    the timestamps are kept sorted so time ranges are resolved by binary search rather than a
+    walk over the whole dict. filters return a new query and leave the original untouched.
+
+    attributes:
+        data (dict[float, dict[str, list[Pose]]]): the parsed session.
+        ts_keys (list): sorted timestamp keys of `data`.
+        timestamps (np.ndarray): `ts_keys` as a float array.
+    """
+
+    def __init__(self, data, _index=None):
+        self.data = data
+        if _index is None:
+            ts_keys = sorted(data.keys())
+            _index = (ts_keys, np.array(ts_keys, dtype=np.float64), {})
+        self.ts_keys, self.timestamps, self._arrays = _index
+        self.model_id = None
+        self.t_range = (0, len(self.ts_keys))
+        self.person_ids = None
+        self.conditions = []
+
+    @classmethod
+    def from_JSON(cls, filepath):
+        """
+        params:
+            filepath (str): path to the session JSON file.
+
+        returns:
+            SessionQuery: query over the whole session.
+        """
+
+        data, _ = parser.clean_dict_from_JSON(filepath)
+        return cls(data)
+
+    def _copy(self):
+        query = SessionQuery(self.data, (self.ts_keys, self.timestamps, self._arrays))
+        query.model_id = self.model_id
+        query.t_range = self.t_range
+        query.person_ids = self.person_ids
+        query.conditions = list(self.conditions)
+        return query
+
+    def models(self):
+        """
+        returns:
+            list[str]: every model id present in the session.
+        """
+
+        return sorted({m for preds in self.data.values() for m in preds})
+
+    def model(self, model_id):
+        """
+        params:
+            model_id (str): model to select.
+
+        returns:
+            SessionQuery: query restricted to `model_id`.
+        """
+
+        query = self._copy()
+        query.model_id = model_id
+        return query
+
+    def between(self, t_start=None, t_end=None):
+        """
+        params:
+            t_start (float, optional): first timestamp to include, in seconds. Defaults to the session start.
+            t_end (float, optional): last timestamp to include, in seconds. Defaults to the session end.
+
+        returns:
+            SessionQuery: query restricted to timestamps in [t_start, t_end], within any existing range.
+        """
+
+        query = self._copy()
+        lo, hi = self.t_range
+        if t_start is not None:
+            lo = max(lo, bisect_left(self.ts_keys, t_start))
+        if t_end is not None:
+            hi = min(hi, bisect_right(self.ts_keys, t_end))
+        query.t_range = (lo, max(lo, hi))
+        return query
+
+    def persons(self, *person_ids):
+        """
+        params:
+            person_ids (int): non-negative indices into each prediction's `poseData` to keep.
+
+        returns:
+            SessionQuery: query restricted to the given persons.
+        """
+
+        if any(not isinstance(p, (int, np.integer)) or p < 0 for p in person_ids):
+            raise ValueError(f'person ids must be non-negative integers, got {list(person_ids)}.')
+        query = self._copy()
+        query.person_ids = [int(p) for p in person_ids]
+        return query
+
+    def where(self, kp_name, op, value):
+        """
+        add a keypoint confidence predicate. predicates are combined with AND; a pose missing
+        the keypoint never matches.
+
+        params:
+            kp_name (str): keypoint name, e.g. 'left_knee'.
+            op (str): one of '<', '<=', '>', '>=', '==', '!='.
+            value (float): confidence score to compare against.
+
+        returns:
+            SessionQuery: query with the predicate added.
+        """
+
+        if op not in OPERATORS:
+            raise ValueError(f'unsupported operator {op}; expected one of {list(OPERATORS)}.')
+        query = self._copy()
+        query.conditions.append((kp_name, op, value))
+        return query
+
+    def _layout(self, lo, hi):
+        """
+        find the keypoint names and maximum person count of the selected model over timestamps
+        [lo, hi), so every chunk of a query shares the same person and keypoint axes.
+
+        returns:
+            tuple: kp names (first-seen order), number of persons.
+        """
+
+        kp_names = []
+        seen = set()
+        n_persons = 0
+        for ts in self.ts_keys[lo:hi]:
+            poses = self.data[ts].get(self.model_id) or []
+            n_persons = max(n_persons, len(poses))
+            for pose in poses:
+                for name in pose.kps:
+                    if name not in seen:
+                        seen.add(name)
+                        kp_names.append(name)
+        return kp_names, n_persons
+
+    def _build_arrays(self, lo, hi, layout):
+        """
+        convert the poses of the selected model over timestamps [lo, hi) into dense arrays.
+
+        params:
+            lo (int): first timestamp index.
+            hi (int): timestamp index one past the last.
+            layout (tuple): kp names and person count from `_layout`, fixing the P and K axes.
+
+        returns:
+            tuple: kp names, coords (T, P, K, 2), scores (T, P, K), pose scores (T, P), present (T, P).
+        """
+
+        with instr.timer('query.build_arrays'):
+            kp_names, n_persons = layout
+            kp_idx = {name: k for k, name in enumerate(kp_names)}
+            preds = [self.data[ts].get(self.model_id) or [] for ts in self.ts_keys[lo:hi]]
+
+            shape = (hi - lo, n_persons, len(kp_names))
+            coords = np.full(shape + (2,), np.nan)
+            scores = np.full(shape, np.nan)
+            pose_scores = np.full(shape[:2], np.nan)
+            present = np.zeros(shape[:2], dtype=bool)
+            for t, poses in enumerate(preds):
+                for p, pose in enumerate(poses):
+                    present[t, p] = True
+                    pose_scores[t, p] = pose.score
+                    for name, kp in pose.kps.items():
+                        k = kp_idx[name]
+                        coords[t, p, k] = kp.coords[:2]
+                        scores[t, p, k] = kp.prob
+            instr.count('query.rows', hi - lo)
+        return kp_names, coords, scores, pose_scores, present
+
+    def _result(self, lo, hi, arrays, offset=0):
+        kp_names, coords, scores, pose_scores, present = arrays
+        # basic slicing keeps these as views into the model arrays
+        sl = slice(lo - offset, hi - offset)
+        coords, scores, pose_scores, mask = coords[sl], scores[sl], pose_scores[sl], present[sl].copy()
+
+        if self.person_ids is not None:
+            keep = np.zeros(mask.shape[1], dtype=bool)
+            keep[[p for p in self.person_ids if p < mask.shape[1]]] = True
+            mask &= keep
+        for kp_name, op, value in self.conditions:
+            if kp_name not in kp_names:
+                mask[:] = False
+                continue
+            kp_scores = scores[:, :, kp_names.index(kp_name)]
+            # nan (missing keypoint) would otherwise match '!='
+            mask &= ~np.isnan(kp_scores) & OPERATORS[op](kp_scores, value)
+
+        return QueryResult(self.data, self.model_id, kp_names, self.ts_keys[lo:hi], self.timestamps[lo:hi],
+                           coords, scores, pose_scores, mask)
+
+    def _require_model(self):
+        if self.model_id is None:
+            raise ValueError('array results need a single model; call .model(model_id) first.')
+
+    def run(self):
+        """
+        evaluate the query as arrays. only the selected time range is converted; the arrays for
+        the most recent range of each model are cached on the query index, so re-running with
+        different person/confidence filters returns views into them. use `chunks` instead to keep
+        memory bounded on long ranges.
+
+        returns:
+            QueryResult: arrays and selection mask for the query.
+        """
+
+        self._require_model()
+        lo, hi = self.t_range
+        cached = self._arrays.get(self.model_id)
+        if cached is None or cached[0] != (lo, hi):
+            cached = ((lo, hi), self._build_arrays(lo, hi, self._layout(lo, hi)))
+            self._arrays[self.model_id] = cached
+        return self._result(lo, hi, cached[1], offset=lo)
+
+    def chunks(self, chunk_size=1000):
+        """
+        evaluate the query in chunks of `chunk_size` timestamps, building arrays only for the
+        chunk being yielded. nothing is cached, so peak memory is bounded by the chunk size.
+        the person and keypoint axes are sized over the whole query range, so chunk arrays can
+        be concatenated along the time axis.
+
+        params:
+            chunk_size (int, optional): number of timestamps per chunk. Defaults to 1000.
+
+        returns:
+            generator of QueryResult, one per chunk, in time order.
+        """
+
+        self._require_model()
+        lo, hi = self.t_range
+        layout = self._layout(lo, hi)
+        for start in range(lo, hi, chunk_size):
+            end = min(start + chunk_size, hi)
+            yield self._result(start, end, self._build_arrays(start, end, layout), offset=start)
+
+    def iter_poses(self):
+        """
+        lazily walk the selected range and yield the matching `Pose` objects without building
+        any arrays. works with or without a model filter.
+
+        returns:
+            generator of (timestamp, model id, person index, Pose) tuples.
+        """
+
+        lo, hi = self.t_range
+        for ts in self.ts_keys[lo:hi]:
+            for model_id, poses in self.data[ts].items():
+                if self.model_id is not None and model_id != self.model_id:
+                    continue
+                for p, pose in enumerate(poses):
+                    if self.person_ids is not None and p not in self.person_ids:
+                        continue
+                    # a null score never matches, as in the array path where it is nan
+                    if all(name in pose.kps and pose.kps[name].prob is not None
+                           and OPERATORS[op](pose.kps[name].prob, value)
+                           for name, op, value in self.conditions):
+                        yield ts, model_id, p, pose
@@ -1,6 +1,8 @@
 import cv2 as cv
 import subprocess
+import instrumentation as instr
 
+@instr.timed('video.convert_webm_to_mp4')
 def convert_webm_to_mp4(webm_path, mp4_path):
     """
     convert a video file from webm format to mp4 format using ffmpeg.
@@ -21,6 +23,7 @@ def convert_webm_to_mp4(webm_path, mp4_path):
     ]
     subprocess.run(command, check=True)
 
+@instr.timed('video.get_frame_from_fnum')
 def get_frame_from_fnum(vidpath, fnum):
     """
     retrieve a specific frame from a video file.
@@ -33,11 +36,17 @@ def get_frame_from_fnum(vidpath, fnum):
         frame: the frame corresponding to the specified frame number.
     """
 
-    cap = cv.VideoCapture(vidpath)
-    cap.set(cv.CAP_PROP_POS_FRAMES, fnum-1)
-    _, frame = cap.read()
+    with instr.timer('video.open'):
+        cap = cv.VideoCapture(vidpath)
+    with instr.timer('video.seek'):
+        cap.set(cv.CAP_PROP_POS_FRAMES, fnum-1)
+    with instr.timer('video.decode'):
+        _, frame = cap.read()
+    instr.count('video.frames_decoded')
+    instr.gauge_memory('video.decode')
     return frame
 
+@instr.timed('video.frame_count')
 def frame_count(video_path, manual=True):
     """
     count the total number of frames in a video file.
@@ -57,6 +66,8 @@ def frame_count(video_path, manual=True):
             if not status:
                 break
             frames += 1
+        instr.count('video.frames_decoded', frames)
+        instr.gauge_memory('video.decode')
         return frames 
 
     cap = cv.VideoCapture(video_path)
@@ -70,6 +81,7 @@ def frame_count(video_path, manual=True):
     cap.release()
     return frames
 
+@instr.timed('video.get_duration')
 def get_duration(filename):
     """
     get the duration of a video file in seconds using ffprobe.